@@ -9,46 +9,237 @@ Hash 生成器工具
 import os
 import sys
 import argparse
+import atexit
+import binascii
 import hashlib
 import fnmatch
+import json
+import mmap
+import queue
+import re
+import threading
+import functools
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from dataclasses import dataclass, field
 from pathlib import Path
-from typing import Set, Optional, List
-
-# 支持的 hash 算法
-SUPPORTED_ALGORITHMS = {
-    'md5': hashlib.md5,
-    'sha1': hashlib.sha1,
-    'sha224': hashlib.sha224,
-    'sha256': hashlib.sha256,
-    'sha384': hashlib.sha384,
-    'sha512': hashlib.sha512,
-    'blake2b': hashlib.blake2b,
-    'blake2s': hashlib.blake2s,
-}
-
-# Hash 文件扩展名
-HASH_EXTENSIONS = set(SUPPORTED_ALGORITHMS.keys())
-
-# 默认算法
+from typing import Set, Optional, List, Iterator, NamedTuple, Pattern, Tuple, FrozenSet, Union, TextIO
+
+try:
+    import blake3  # pyright: ignore[reportMissingImports]
+    HAS_BLAKE3 = True
+except ImportError:
+    HAS_BLAKE3 = False
+
+# 支持的 hash 算法（按名称分派给 hashlib.new，自动包含 sha3 等标准算法；shake 系列为变长输出，不适用）
+SUPPORTED_ALGORITHMS = frozenset(
+    name for name in hashlib.algorithms_guaranteed if not name.startswith('shake_')
+)
+
+# BLAKE3（可选依赖，pip install blake3）：SIMD 加速，并可多线程计算单个大文件
+if HAS_BLAKE3:
+    SUPPORTED_ALGORITHMS |= {'blake3'}
+
+# Hash 文件扩展名（未安装 blake3 时也识别 .blake3 文件，便于删除）
+HASH_EXTENSIONS = SUPPORTED_ALGORITHMS | {'blake3'}
+
+# 默认算法（不随是否安装 blake3 变化，保证同一命令总是生成同一种 hash 文件；blake3 需通过 --algorithm 显式指定）
 DEFAULT_ALGORITHM = 'sha256'
 
-# 读取文件的块大小（用于大文件）
-CHUNK_SIZE = 8192
+# 读取文件的块大小（Python 3.11 以下的回退路径，较大的块可摊薄解释器开销）
+CHUNK_SIZE = 1 << 20
+
+# 超过该大小的文件使用 mmap 一次性交给 hash 函数（1 MiB）
+MMAP_THRESHOLD = 1 << 20
+
+# 线程池模式下同时进行的文件读取数（提高存储设备的队列深度，重叠多个文件的缓存未命中）
+IO_QUEUE_DEPTH = 32
+
+# 写入 hash 文件时使用的打开标志（O_CLOEXEC 仅 POSIX，O_BINARY 仅 Windows）
+SIDECAR_OPEN_FLAGS = (
+    os.O_WRONLY | os.O_CREAT | os.O_TRUNC
+    | getattr(os, 'O_CLOEXEC', 0) | getattr(os, 'O_BINARY', 0)
+)
+
+# 后台写出线程每次最多合并写出的状态条目数
+OUTPUT_BATCH_SIZE = 1000
+
+# 非详细模式下，每处理多少个文件刷新一次进度
+PROGRESS_INTERVAL = 1000
+
+# 文件系统是否大小写不敏感（与 fnmatch 的 os.path.normcase 行为保持一致）
+_CASE_INSENSITIVE = os.path.normcase('A') == 'a'
+
+
+# 状态输出队列，由后台线程批量写出，处理文件的线程无需等待终端写入
+# 条目为 (目标流, 文本)；threading.Event 为刷新请求
+_output_queue: "queue.SimpleQueue[Union[Tuple[TextIO, str], threading.Event]]" = queue.SimpleQueue()
+_output_writer: Optional[threading.Thread] = None
+
+
+def _write_output(stream: TextIO, texts: List[str]) -> None:
+    """
+    将多条状态信息合并后一次写出到目标流
+    
+    Args:
+        stream: 目标流（调用 emit 时的标准输出）
+        texts: 状态信息列表
+    """
+    if not texts:
+        return
+    text = ''.join(texts)
+    try:
+        buffer = getattr(stream, 'buffer', None)
+        if buffer is not None:
+            buffer.write(text.encode(stream.encoding or 'utf-8', 'replace'))
+            buffer.flush()
+        else:
+            # 没有底层二进制缓冲区的流（如 io.StringIO）直接写入文本
+            stream.write(text)
+            stream.flush()
+    except Exception:
+        # 目标流已关闭或不可写（如管道另一端提前退出），丢弃该批输出，避免写出线程退出导致等待方阻塞
+        pass
+
+
+def _drain_output(output_queue: "queue.SimpleQueue[Union[Tuple[TextIO, str], threading.Event]]") -> None:
+    """
+    后台写出线程：每次取出队列中已有的条目（最多 OUTPUT_BATCH_SIZE 条），按目标流合并后写出
+    
+    Args:
+        output_queue: 状态输出队列
+    """
+    while True:
+        batch = [output_queue.get()]
+        while len(batch) < OUTPUT_BATCH_SIZE:
+            try:
+                batch.append(output_queue.get_nowait())
+            except queue.Empty:
+                break
+        
+        stream = None
+        texts = []
+        for item in batch:
+            if isinstance(item, threading.Event):
+                # 刷新请求：先写出之前的内容，再通知等待方
+                _write_output(stream, texts)
+                stream, texts = None, []
+                item.set()
+                continue
+            
+            item_stream, text = item
+            if item_stream is not stream:
+                _write_output(stream, texts)
+                stream, texts = item_stream, []
+            texts.append(text)
+        _write_output(stream, texts)
 
 
-def should_ignore(path: Path, ignore_patterns: List[str], base_path: Path) -> bool:
+def emit(message: str, end: str = '\n') -> None:
+    """
+    将状态信息放入输出队列，由后台线程写出到当前的标准输出
+    
+    Args:
+        message: 状态信息
+        end: 结尾字符（默认换行）
+    """
+    global _output_writer
+    if _output_writer is None:
+        _output_writer = threading.Thread(target=_drain_output, args=(_output_queue,), daemon=True)
+        _output_writer.start()
+    # 在调用时确定目标流，避免写出时 sys.stdout 已被替换
+    _output_queue.put((sys.stdout, message + end))
+
+
+def flush_output() -> None:
+    """等待输出队列中的内容全部写出"""
+    if _output_writer is None or not _output_writer.is_alive():
+        return
+    # 先写出 print 留在文本层的内容，保证输出顺序
+    sys.stdout.flush()
+    done = threading.Event()
+    _output_queue.put(done)
+    # 写出线程意外退出时不再等待，避免进程（包括 atexit）挂起
+    while not done.wait(0.1):
+        if not _output_writer.is_alive():
+            return
+
+
+atexit.register(flush_output)
+
+
+class IgnoreRules(NamedTuple):
+    """预编译的忽略规则（由 compile_ignore_patterns 生成）"""
+    literals: FrozenSet[str]
+    path_regex: Optional[Pattern[str]]
+    part_regex: Optional[Pattern[str]]
+    prefixes: Tuple[str, ...]
+    infixes: Tuple[str, ...]
+    suffixes: Tuple[str, ...]
+
+
+def compile_ignore_patterns(ignore_patterns: Optional[List[str]]) -> Optional[IgnoreRules]:
+    """
+    将忽略模式列表预编译为忽略规则
+    
+    普通名称放入集合直接比较；通配符模式合并为一个正则表达式，只需翻译和编译一次
+    
+    Args:
+        ignore_patterns: 忽略模式列表（支持通配符）
+        
+    Returns:
+        忽略规则，没有有效模式时返回 None
+    """
+    patterns = []
+    for pattern in ignore_patterns or []:
+        pattern = pattern.strip()
+        if not pattern:
+            continue
+        # 规范化模式（使用正斜杠，大小写不敏感的平台上统一小写）
+        pattern = pattern.replace('\\', '/')
+        if _CASE_INSENSITIVE:
+            pattern = pattern.lower()
+        patterns.append(pattern)
+    
+    if not patterns:
+        return None
+    
+    # 大多数模式是普通名称（如 __pycache__、.git），直接用集合判断，无需正则
+    literals = frozenset(p for p in patterns if not any(c in p for c in '*?['))
+    globs = [p for p in patterns if p not in literals]
+    
+    path_regex = None
+    part_regex = None
+    if globs:
+        # 完整路径匹配：pattern 或 */pattern
+        path_regex = re.compile('|'.join(
+            f"(?:{fnmatch.translate(p)})|(?:{fnmatch.translate(f'*/{p}')})" for p in globs
+        ))
+        # 路径各部分匹配
+        part_regex = re.compile('|'.join(f"(?:{fnmatch.translate(p)})" for p in globs))
+    
+    return IgnoreRules(
+        literals=literals,
+        path_regex=path_regex,
+        part_regex=part_regex,
+        prefixes=tuple(patterns),
+        infixes=tuple(f"/{p}/" for p in patterns),
+        suffixes=tuple(f"/{p}" for p in patterns),
+    )
+
+
+def should_ignore(path: Path, ignore_rules: Optional[IgnoreRules], base_path: Path) -> bool:
     """
     检查路径是否应该被忽略
     
     Args:
         path: 要检查的路径
-        ignore_patterns: 忽略模式列表（支持通配符）
+        ignore_rules: 预编译的忽略规则
         base_path: 基础路径（用于计算相对路径）
         
     Returns:
         如果应该忽略返回 True，否则返回 False
     """
-    if not ignore_patterns:
+    if not ignore_rules:
         return False
     
     # 计算相对路径（相对于 base_path）
@@ -60,142 +251,503 @@ def should_ignore(path: Path, ignore_patterns: List[str], base_path: Path) -> bo
     
     # 转换为字符串，使用正斜杠（跨平台兼容）
     path_str = str(relative_path).replace('\\', '/')
+    if _CASE_INSENSITIVE:
+        path_str = path_str.lower()
+    
+    # 检查路径是否以模式开头、包含或结尾（用于目录）
+    if path_str.startswith(ignore_rules.prefixes) or path_str.endswith(ignore_rules.suffixes):
+        return True
+    if any(infix in path_str for infix in ignore_rules.infixes):
+        return True
+    
     path_parts = path_str.split('/')
     
-    # 检查每个忽略模式
-    for pattern in ignore_patterns:
-        pattern = pattern.strip()
-        if not pattern:
-            continue
-        
-        # 规范化模式（使用正斜杠）
-        pattern = pattern.replace('\\', '/')
-        
-        # 检查完整路径是否匹配
-        if fnmatch.fnmatch(path_str, pattern) or fnmatch.fnmatch(path_str, f"*/{pattern}"):
+    # 检查路径的每个部分是否为普通名称模式
+    if ignore_rules.literals and not ignore_rules.literals.isdisjoint(path_parts):
+        return True
+    
+    # 检查完整路径是否匹配通配符模式
+    if ignore_rules.path_regex and ignore_rules.path_regex.match(path_str):
+        return True
+    
+    # 检查路径的每个部分是否匹配通配符模式
+    if ignore_rules.part_regex:
+        part_match = ignore_rules.part_regex.match
+        if any(part_match(part) for part in path_parts):
             return True
+    
+    return False
+
+
+def should_ignore_dir(dir_path: str, ignore_rules: IgnoreRules, base_path: str) -> bool:
+    """
+    检查目录是否应该被忽略（被忽略的目录不会再向下遍历，每个目录只检查一次）
+    
+    Args:
+        dir_path: 目录路径
+        ignore_rules: 预编译的忽略规则
+        base_path: 基础路径（用于计算相对路径）
         
-        # 检查路径的每个部分是否匹配
-        for part in path_parts:
-            if fnmatch.fnmatch(part, pattern):
-                return True
+    Returns:
+        如果应该忽略返回 True，否则返回 False
+    """
+    return should_ignore(Path(dir_path), ignore_rules, Path(base_path))
+
+
+def new_hash(algorithm: str):
+    """
+    按名称创建 hash 对象
+    
+    Args:
+        algorithm: hash 算法名称
         
-        # 检查路径是否以模式开头（用于目录）
-        if path_str.startswith(pattern) or f"/{pattern}/" in path_str or path_str.endswith(f"/{pattern}"):
-            return True
+    Returns:
+        hash 对象（hashlib.new 会优先使用 OpenSSL 的硬件加速实现）
+    """
+    if algorithm == 'blake3':
+        return blake3.blake3()
+    return hashlib.new(algorithm)
+
+
+def _fadvise(fd: int, *advice_names: str) -> None:
+    """
+    通过 posix_fadvise 向内核提示文件的访问方式（不支持的平台上忽略）
     
-    return False
+    Args:
+        fd: 文件描述符
+        advice_names: os 模块中的 POSIX_FADV_* 常量名
+    """
+    if not hasattr(os, 'posix_fadvise'):
+        return
+    for name in advice_names:
+        try:
+            os.posix_fadvise(fd, 0, 0, getattr(os, name))
+        except OSError:
+            pass
 
 
-def calculate_hash(file_path: Path, algorithm: str) -> str:
+def _digest_open_file(f, file_path: Path, algorithm: str, multithreaded: bool = False) -> bytes:
     """
-    计算单个文件的 hash 值
+    计算已打开文件的 hash 摘要
     
     Args:
+        f: 以二进制无缓冲模式打开的文件对象
         file_path: 文件路径
         algorithm: hash 算法名称
+        multithreaded: 允许算法自身使用多线程计算单个大文件（目前仅 blake3）
         
     Returns:
-        hash 值的十六进制字符串
+        hash 摘要的原始字节
+    """
+    hash_constructor = functools.partial(new_hash, algorithm)
+    
+    # 大文件使用 mmap，由内核直接将页面映射给 hash 函数，避免逐块复制
+    if os.fstat(f.fileno()).st_size >= MMAP_THRESHOLD:
+        try:
+            if algorithm == 'blake3':
+                # BLAKE3 由 Rust 实现自行 mmap 文件；串行处理时使用多线程计算，
+                # 并行处理时每个任务单线程，避免各进程各自启动 CPU 核心数的线程
+                if multithreaded:
+                    hash_func = blake3.blake3(max_threads=blake3.blake3.AUTO)
+                else:
+                    hash_func = blake3.blake3()
+                hash_func.update_mmap(file_path)
+            else:
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                    if hasattr(mm, 'madvise') and hasattr(mmap, 'MADV_SEQUENTIAL'):
+                        mm.madvise(mmap.MADV_SEQUENTIAL)
+                    hash_func = hash_constructor()
+                    hash_func.update(mm)
+            return hash_func.digest()
+        except (ValueError, OSError):
+            # mmap 不可用时（如部分 Windows 场景）回退到普通读取
+            f.seek(0)
+    
+    # Python 3.11+ 使用 hashlib.file_digest，读取与更新循环完全在 C 层完成
+    if hasattr(hashlib, 'file_digest'):
+        return hashlib.file_digest(f, hash_constructor).digest()
+    
+    # 回退路径：读入可复用的缓冲区，避免每个块都分配新的 bytes 对象
+    hash_func = hash_constructor()
+    buffer = bytearray(CHUNK_SIZE)
+    view = memoryview(buffer)
+    while size := f.readinto(buffer):
+        hash_func.update(view[:size])
+    return hash_func.digest()
+
+
+def calculate_digest(file_path: Path, algorithm: str, multithreaded: bool = False) -> bytes:
+    """
+    计算单个文件的 hash 摘要
+    
+    Args:
+        file_path: 文件路径
+        algorithm: hash 算法名称
+        multithreaded: 允许算法自身使用多线程计算单个大文件（仅应在串行处理时启用）
+        
+    Returns:
+        hash 摘要的原始字节
     """
     if algorithm not in SUPPORTED_ALGORITHMS:
         raise ValueError(f"不支持的算法: {algorithm}")
     
-    hash_func = SUPPORTED_ALGORITHMS[algorithm]()
-    
     try:
-        with open(file_path, 'rb') as f:
-            while chunk := f.read(CHUNK_SIZE):
-                hash_func.update(chunk)
-        return hash_func.hexdigest()
+        # 每次都是大块读取，无需 BufferedReader 再缓冲一次
+        with open(file_path, 'rb', buffering=0) as f:
+            fd = f.fileno()
+            # 小文件一次读完，预读提示带来的收益抵不上额外的系统调用
+            large = os.fstat(fd).st_size >= MMAP_THRESHOLD
+            if large:
+                # 整个文件顺序读取：扩大预读窗口，并立即开始异步预读
+                _fadvise(fd, 'POSIX_FADV_SEQUENTIAL', 'POSIX_FADV_WILLNEED')
+            try:
+                return _digest_open_file(f, file_path, algorithm, multithreaded)
+            finally:
+                if large:
+                    # 计算完成后释放该文件的页缓存，避免挤占更常用的缓存
+                    _fadvise(fd, 'POSIX_FADV_DONTNEED')
     except IOError as e:
         raise IOError(f"读取文件失败: {file_path} - {e}")
 
 
-def is_hash_file(file_path: Path) -> bool:
+def calculate_hash(file_path: Path, algorithm: str) -> str:
     """
-    判断文件是否为 hash 文件
+    计算单个文件的 hash 值
     
     Args:
         file_path: 文件路径
+        algorithm: hash 算法名称
         
     Returns:
-        如果是 hash 文件返回 True，否则返回 False
+        hash 值的十六进制字符串
     """
-    if not file_path.is_file():
-        return False
+    return binascii.hexlify(calculate_digest(file_path, algorithm)).decode('ascii')
+
+
+def is_hash_filename(name: str) -> bool:
+    """
+    根据文件名判断是否为 hash 文件（只检查扩展名，不访问文件系统）
     
+    Args:
+        name: 文件名
+        
+    Returns:
+        如果是 hash 文件返回 True，否则返回 False
+    """
     # 获取文件扩展名（去掉点号）
-    suffix = file_path.suffix.lstrip('.')
+    suffix = os.path.splitext(name)[1][1:]
     return suffix.lower() in HASH_EXTENSIONS
 
 
-def generate_hash_file(file_path: Path, algorithm: str) -> Path:
+def is_hash_file(file_path: Path) -> bool:
+    """
+    判断文件是否为 hash 文件
+    
+    Args:
+        file_path: 文件路径
+        
+    Returns:
+        如果是 hash 文件返回 True，否则返回 False
+    """
+    return is_hash_filename(file_path.name)
+
+
+def write_hash_file(file_path: Path, algorithm: str, hash_value: bytes) -> Path:
     """
-    为单个文件生成 hash 文件
+    将 hash 值写入 hash 文件
     
     Args:
         file_path: 源文件路径
         algorithm: hash 算法名称
+        hash_value: 十六进制 hash 值（ASCII 字节）
         
     Returns:
         生成的 hash 文件路径
     """
-    # 计算 hash 值
-    hash_value = calculate_hash(file_path, algorithm)
-    
     # 生成 hash 文件路径：原文件名.算法
     hash_file_path = file_path.parent / f"{file_path.name}.{algorithm}"
     
-    # 写入 hash 文件
+    # 写入 hash 文件（内容很短，直接使用底层文件描述符，省去文本 IO 包装的开销）
     try:
-        with open(hash_file_path, 'w', encoding='utf-8') as f:
-            f.write(hash_value)
+        fd = os.open(hash_file_path, SIDECAR_OPEN_FLAGS, 0o644)
+        try:
+            os.write(fd, hash_value)
+        finally:
+            os.close(fd)
         return hash_file_path
     except IOError as e:
         raise IOError(f"写入 hash 文件失败: {hash_file_path} - {e}")
 
 
-def process_file(file_path: Path, algorithm: str, ignore_patterns: Optional[List[str]] = None, base_path: Optional[Path] = None) -> bool:
+class HashResult(NamedTuple):
+    """单个文件的 hash 生成结果"""
+    file_path: Path
+    algorithm: str
+    hash_file_path: Optional[Path]
+    hash_value: Optional[str]
+    error: Optional[str]  # 错误信息（不含 "✗ 错误:" 等面向终端的前缀）
+    skipped: bool = False
+
+
+def needs_rehash(file_path: Path, algorithm: str) -> bool:
+    """
+    判断文件是否需要重新计算 hash
+    
+    hash 文件存在、非空，且修改时间晚于源文件的修改时间和状态变更时间（ctime）时，认为源文件未变更。
+    mv、cp -p、rsync -a、tar x 等会保留旧的修改时间，但无法回拨 ctime
+    
+    Args:
+        file_path: 源文件路径
+        algorithm: hash 算法名称
+        
+    Returns:
+        需要重新计算返回 True，否则返回 False
+    """
+    hash_file_path = file_path.parent / f"{file_path.name}.{algorithm}"
+    try:
+        hash_stat = os.stat(hash_file_path)
+        source_stat = os.stat(file_path)
+    except OSError:
+        return True
+    # 时间相同时仍重新计算（时间精度较粗的文件系统上无法区分先后）
+    source_changed_ns = max(source_stat.st_mtime_ns, source_stat.st_ctime_ns)
+    return hash_stat.st_size == 0 or hash_stat.st_mtime_ns <= source_changed_ns
+
+
+def _hash_one(file_path: Path, algorithm: str, force: bool = False, multithreaded: bool = False) -> HashResult:
+    """
+    为单个文件生成 hash 文件（模块级函数，可被进程池序列化调用）
+    
+    Args:
+        file_path: 文件路径
+        algorithm: hash 算法名称
+        force: 忽略已有的 hash 文件，总是重新计算
+        multithreaded: 允许算法自身使用多线程计算单个大文件（仅串行处理时启用）
+        
+    Returns:
+        处理结果，失败时 error 为异常信息
+    """
+    # hash 文件比源文件新时直接复用，不再读取源文件
+    if not force and not needs_rehash(file_path, algorithm):
+        hash_file_path = file_path.parent / f"{file_path.name}.{algorithm}"
+        try:
+            with open(hash_file_path, 'rb') as f:
+                hash_value = f.read().strip().decode('ascii')
+            return HashResult(file_path, algorithm, hash_file_path, hash_value, None, skipped=True)
+        except (OSError, UnicodeDecodeError):
+            # hash 文件无法读取时重新计算
+            pass
+    
+    try:
+        before = os.stat(file_path)
+        # 十六进制为纯 ASCII，直接得到字节，无需文本编码
+        hash_value = binascii.hexlify(calculate_digest(file_path, algorithm, multithreaded))
+        hash_file_path = write_hash_file(file_path, algorithm, hash_value)
+        # 写入 hash 文件后再检查源文件：计算期间被修改（如仍在写入的日志、下载中的文件）时，
+        # hash 文件的摘要已过期却比源文件新，之后会一直被跳过，因此删除。
+        # 检查之后的修改会使源文件的 ctime 晚于 hash 文件，下次运行时仍会重新计算
+        after = os.stat(file_path)
+        if (before.st_size, before.st_mtime_ns, before.st_ctime_ns) != (after.st_size, after.st_mtime_ns, after.st_ctime_ns):
+            hash_file_path.unlink()
+            raise IOError(f"文件在计算 hash 期间被修改: {file_path}")
+        return HashResult(file_path, algorithm, hash_file_path, hash_value.decode('ascii'), None)
+    except IOError as e:
+        # calculate_digest / write_hash_file 的异常信息已包含文件路径
+        return HashResult(file_path, algorithm, None, None, str(e))
+    except Exception as e:
+        return HashResult(file_path, algorithm, None, None, f"{file_path} - {e}")
+
+
+def report_result(result: HashResult, verbose: bool = True, as_json: bool = False) -> bool:
+    """
+    输出单个文件的处理结果
+    
+    Args:
+        result: 处理结果
+        verbose: 是否输出成功信息（错误信息总是输出）
+        as_json: 以 JSON Lines 格式输出（每个文件一行，忽略 verbose）
+        
+    Returns:
+        成功返回 True，失败返回 False
+    """
+    if as_json:
+        record = {'path': str(result.file_path), 'algo': result.algorithm}
+        if result.error:
+            record['error'] = result.error
+        else:
+            record['hash'] = result.hash_value
+            if result.skipped:
+                record['skipped'] = True
+        # 转义非 ASCII 字符：无法按 UTF-8 解码的文件名（surrogateescape）也能无损输出，不会被替换成其他路径
+        emit(json.dumps(record))
+        return not result.error
+    
+    if result.error:
+        emit(f"✗ 错误: {result.error}")
+        return False
+    if verbose:
+        if result.skipped:
+            emit(f"✓ 未变更，跳过: {result.file_path}")
+        else:
+            emit(f"✓ 已生成: {result.hash_file_path}")
+    return True
+
+
+def process_file(file_path: Path, algorithm: str, ignore_rules: Optional[IgnoreRules] = None, base_path: Optional[Path] = None, as_json: bool = False, force: bool = False) -> Optional[HashResult]:
     """
     处理单个文件（生成 hash）
     
     Args:
         file_path: 文件路径
         algorithm: hash 算法名称
-        ignore_patterns: 忽略模式列表
+        ignore_rules: 预编译的忽略规则
         base_path: 基础路径（用于计算相对路径）
+        as_json: 以 JSON Lines 格式输出结果
+        force: 忽略已有的 hash 文件，总是重新计算
         
     Returns:
-        成功返回 True，失败返回 False
+        处理结果；文件被跳过（hash 文件本身、被忽略或不存在）时返回 None
     """
     # 跳过 hash 文件本身
     if is_hash_file(file_path):
-        return False
+        return None
     
     # 检查是否应该忽略
-    if ignore_patterns and base_path:
-        if should_ignore(file_path, ignore_patterns, base_path):
-            return False
+    if ignore_rules and base_path:
+        if should_ignore(file_path, ignore_rules, base_path):
+            return None
     
     # 检查文件是否存在
     if not file_path.is_file():
-        print(f"⚠ 警告: 文件不存在，跳过: {file_path}")
-        return False
+        # JSON 输出时提示信息写到标准错误，保持标准输出为纯 JSON Lines
+        print(f"⚠ 警告: 文件不存在，跳过: {file_path}", file=sys.stderr if as_json else sys.stdout)
+        return None
     
-    try:
-        hash_file_path = generate_hash_file(file_path, algorithm)
-        print(f"✓ 已生成: {hash_file_path}")
-        return True
-    except IOError as e:
-        print(f"✗ 错误: {e}")
-        return False
-    except Exception as e:
-        print(f"✗ 未预期的错误: {file_path} - {e}")
-        return False
+    result = _hash_one(file_path, algorithm, force, multithreaded=True)
+    report_result(result, as_json=as_json)
+    flush_output()
+    return result
 
 
-def process_directory(directory_path: Path, algorithm: str, recursive: bool = True, ignore_patterns: Optional[List[str]] = None) -> tuple[int, int]:
+@dataclass
+class FileTree:
+    """
+    目录扫描结果（列式存储）
+    
+    一次遍历同时记录源文件和 hash 文件，生成和删除模式共用同一套扫描逻辑
+    """
+    paths: List[str] = field(default_factory=list)
+    sizes: List[int] = field(default_factory=list)
+    is_hash: List[bool] = field(default_factory=list)
+    
+    def source_files(self) -> List[Path]:
+        """需要生成 hash 的文件，按大小降序排列（大文件先开始，避免并行处理时的长尾）"""
+        files = [(path, size) for path, size, is_hash in zip(self.paths, self.sizes, self.is_hash) if not is_hash]
+        files.sort(key=lambda item: item[1], reverse=True)
+        return [Path(path) for path, _ in files]
+    
+    def hash_files(self) -> List[Path]:
+        """已存在的 hash 文件"""
+        return [Path(path) for path, is_hash in zip(self.paths, self.is_hash) if is_hash]
+
+
+def scan_tree(directory_path: Path, recursive: bool = True, ignore_rules: Optional[IgnoreRules] = None) -> FileTree:
+    """
+    遍历目录，构建 FileTree（基于 os.scandir，文件类型直接来自目录项，无需逐个 stat）
+    
+    被忽略的目录会被剪枝，不再向下遍历
+    
+    Args:
+        directory_path: 目录路径
+        recursive: 是否递归处理子目录
+        ignore_rules: 预编译的忽略规则
+        
+    Returns:
+        目录扫描结果
+    """
+    tree = FileTree()
+    base_path = str(directory_path)
+    pending = [base_path]
+    
+    while pending:
+        try:
+            with os.scandir(pending.pop()) as it:
+                entries = list(it)
+        except OSError:
+            # 与 os.walk 一致：无法读取的目录直接跳过
+            continue
+        
+        subdirs = []
+        for entry in entries:
+            try:
+                if entry.is_dir(follow_symlinks=False):
+                    # 剪枝：被忽略的目录不再向下遍历
+                    if recursive and not (ignore_rules and should_ignore_dir(entry.path, ignore_rules, base_path)):
+                        subdirs.append(entry.path)
+                    continue
+                if not entry.is_file():
+                    continue
+                
+                if ignore_rules and should_ignore(Path(entry.path), ignore_rules, directory_path):
+                    continue
+                
+                is_hash = is_hash_filename(entry.name)
+                tree.paths.append(entry.path)
+                tree.sizes.append(0 if is_hash else entry.stat().st_size)
+                tree.is_hash.append(is_hash)
+            except OSError:
+                continue
+        
+        # 逆序入栈，保持目录的遍历顺序
+        pending.extend(reversed(subdirs))
+    
+    return tree
+
+
+def iter_hash_results(file_paths: List[Path], algorithm: str, jobs: Optional[int] = None, use_threads: bool = False, force: bool = False) -> Iterator[HashResult]:
+    """
+    并行计算多个文件的 hash（进程池分批处理时结果顺序与输入顺序不同）
+    
+    Args:
+        file_paths: 文件路径列表
+        algorithm: hash 算法名称
+        jobs: 并行任务数（进程池默认为 CPU 核心数，线程池默认为 IO_QUEUE_DEPTH，1 表示串行）
+        use_threads: 使用线程池代替进程池（适合 I/O 密集场景，hashlib 在 update 时会释放 GIL）
+        force: 忽略已有的 hash 文件，总是重新计算
+        
+    Returns:
+        处理结果迭代器
+    """
+    if jobs is None:
+        jobs = IO_QUEUE_DEPTH if use_threads else (os.cpu_count() or 1)
+    
+    # 单任务或文件很少时直接串行处理，避免进程池启动开销
+    if jobs <= 1 or len(file_paths) <= 1:
+        for file_path in file_paths:
+            yield _hash_one(file_path, algorithm, force, multithreaded=True)
+        return
+    
+    workers = min(jobs, len(file_paths))
+    if use_threads:
+        executor = ThreadPoolExecutor(max_workers=workers)
+    else:
+        if sys.platform == 'win32':
+            # Windows 下 ProcessPoolExecutor 最多支持 61 个进程
+            workers = min(workers, 61)
+        executor = ProcessPoolExecutor(max_workers=workers)
+    
+    # 每批任务数随文件数量调整，减少进程间通信次数
+    chunksize = max(1, min(16, len(file_paths) // (workers * 4)))
+    if chunksize > 1 and not use_threads:
+        # 按步长轮流发牌组成批次：输入按大小降序时，最大的几个文件分散到不同批次、由不同进程处理，
+        # 而不是连续落在同一批次里由一个进程依次处理
+        batch_count = -(-len(file_paths) // chunksize)
+        file_paths = [path for start in range(batch_count) for path in file_paths[start::batch_count]]
+    with executor:
+        yield from executor.map(functools.partial(_hash_one, algorithm=algorithm, force=force), file_paths, chunksize=chunksize)
+
+
+def process_directory(directory_path: Path, algorithm: str, recursive: bool = True, ignore_rules: Optional[IgnoreRules] = None, jobs: Optional[int] = None, use_threads: bool = False, verbose: bool = False, as_json: bool = False, force: bool = False) -> tuple[int, int, int]:
     """
     处理目录（递归处理所有文件）
     
@@ -203,59 +755,59 @@ def process_directory(directory_path: Path, algorithm: str, recursive: bool = Tr
         directory_path: 目录路径
         algorithm: hash 算法名称
         recursive: 是否递归处理子目录
-        ignore_patterns: 忽略模式列表
+        ignore_rules: 预编译的忽略规则
+        jobs: 并行任务数（默认见 iter_hash_results）
+        use_threads: 使用线程池代替进程池
+        verbose: 是否逐个输出已生成的文件（否则只在终端中定期刷新进度）
+        as_json: 以 JSON Lines 格式逐个输出结果（不输出进度）
+        force: 忽略已有的 hash 文件，总是重新计算
         
     Returns:
-        (成功数量, 失败数量)
+        (成功数量, 失败数量, 未变更跳过的数量)
     """
     if not directory_path.is_dir():
-        print(f"✗ 错误: 目录不存在: {directory_path}")
-        return (0, 0)
+        print(f"✗ 错误: 目录不存在: {directory_path}", file=sys.stderr if as_json else sys.stdout)
+        return (0, 0, 0)
     
     success_count = 0
     fail_count = 0
+    skipped_count = 0
     
-    # 遍历目录
-    if recursive:
-        # 递归遍历所有文件和目录
-        for item_path in directory_path.rglob('*'):
-            # 检查目录是否应该被忽略
-            if item_path.is_dir():
-                if ignore_patterns and should_ignore(item_path, ignore_patterns, directory_path):
-                    continue
-            
-            # 处理文件
-            if item_path.is_file():
-                if process_file(item_path, algorithm, ignore_patterns, directory_path):
-                    success_count += 1
-                else:
-                    fail_count += 1
-    else:
-        # 只处理当前目录的文件
-        for item_path in directory_path.iterdir():
-            # 检查目录是否应该被忽略
-            if item_path.is_dir():
-                if ignore_patterns and should_ignore(item_path, ignore_patterns, directory_path):
-                    continue
-            
-            # 处理文件
-            if item_path.is_file():
-                if process_file(item_path, algorithm, ignore_patterns, directory_path):
-                    success_count += 1
-                else:
-                    fail_count += 1
+    # 先收集文件列表，再并行处理（文件之间互不依赖）
+    file_paths = scan_tree(directory_path, recursive, ignore_rules).source_files()
+    total = len(file_paths)
+    show_progress = not verbose and not as_json and sys.stdout.isatty()
+    progress_on_line = False
+    for done, result in enumerate(iter_hash_results(file_paths, algorithm, jobs, use_threads, force), 1):
+        if progress_on_line and result.error:
+            # 进度行没有换行，先结束该行，避免错误信息接在进度后面
+            emit('')
+            progress_on_line = False
+        if not report_result(result, verbose, as_json):
+            fail_count += 1
+        elif result.skipped:
+            skipped_count += 1
+        else:
+            success_count += 1
+        
+        if show_progress and (done % PROGRESS_INTERVAL == 0 or done == total):
+            emit(f"\r已处理: {done}/{total} 个文件", end='')
+            flush_output()
+            progress_on_line = True
     
-    return (success_count, fail_count)
+    flush_output()
+    return (success_count, fail_count, skipped_count)
 
 
-def delete_hash_files(directory_path: Path, recursive: bool = True, ignore_patterns: Optional[List[str]] = None) -> int:
+def delete_hash_files(directory_path: Path, recursive: bool = True, ignore_rules: Optional[IgnoreRules] = None, verbose: bool = False) -> int:
     """
     删除目录下所有 hash 文件
     
     Args:
         directory_path: 目录路径
         recursive: 是否递归处理子目录
-        ignore_patterns: 忽略模式列表
+        ignore_rules: 预编译的忽略规则
+        verbose: 是否逐个输出已删除的文件
         
     Returns:
         删除的文件数量
@@ -266,52 +818,18 @@ def delete_hash_files(directory_path: Path, recursive: bool = True, ignore_patte
     
     deleted_count = 0
     
-    # 遍历目录
-    if recursive:
-        # 递归遍历所有文件和目录
-        for item_path in directory_path.rglob('*'):
-            # 检查目录是否应该被忽略
-            if item_path.is_dir():
-                if ignore_patterns and should_ignore(item_path, ignore_patterns, directory_path):
-                    continue
-            
-            # 处理 hash 文件
-            if item_path.is_file() and is_hash_file(item_path):
-                # 检查是否应该忽略
-                if ignore_patterns and should_ignore(item_path, ignore_patterns, directory_path):
-                    continue
-                
-                try:
-                    item_path.unlink()
-                    print(f"✓ 已删除: {item_path}")
-                    deleted_count += 1
-                except IOError as e:
-                    print(f"✗ 删除失败: {item_path} - {e}")
-                except Exception as e:
-                    print(f"✗ 未预期的错误: {item_path} - {e}")
-    else:
-        # 只处理当前目录的文件
-        for item_path in directory_path.iterdir():
-            # 检查目录是否应该被忽略
-            if item_path.is_dir():
-                if ignore_patterns and should_ignore(item_path, ignore_patterns, directory_path):
-                    continue
-            
-            # 处理 hash 文件
-            if item_path.is_file() and is_hash_file(item_path):
-                # 检查是否应该忽略
-                if ignore_patterns and should_ignore(item_path, ignore_patterns, directory_path):
-                    continue
-                
-                try:
-                    item_path.unlink()
-                    print(f"✓ 已删除: {item_path}")
-                    deleted_count += 1
-                except IOError as e:
-                    print(f"✗ 删除失败: {item_path} - {e}")
-                except Exception as e:
-                    print(f"✗ 未预期的错误: {item_path} - {e}")
+    for item_path in scan_tree(directory_path, recursive, ignore_rules).hash_files():
+        try:
+            item_path.unlink()
+            if verbose:
+                emit(f"✓ 已删除: {item_path}")
+            deleted_count += 1
+        except IOError as e:
+            emit(f"✗ 删除失败: {item_path} - {e}")
+        except Exception as e:
+            emit(f"✗ 未预期的错误: {item_path} - {e}")
     
+    flush_output()
     return deleted_count
 
 
@@ -321,18 +839,23 @@ def main():
         description='Hash 生成器工具 - 为文件或目录生成 hash 值',
         formatter_class=argparse.RawDescriptionHelpFormatter,
         epilog=f"""
-支持的算法: {', '.join(SUPPORTED_ALGORITHMS.keys())}
+支持的算法: {', '.join(sorted(SUPPORTED_ALGORITHMS))}
 默认算法: {DEFAULT_ALGORITHM}
 
 示例:
-  python hash_generator.py --file file.txt                    # 为单个文件生成 sha256 hash
+  python hash_generator.py --file file.txt                    # 使用默认算法为单个文件生成 hash
+  python hash_generator.py --file file.txt --algorithm sha256 # 为单个文件生成 sha256 hash
   python hash_generator.py --file file.txt --algorithm md5   # 为单个文件生成 md5 hash
-  python hash_generator.py --directory ./docs                # 为目录下所有文件生成 sha256 hash（递归）
+  python hash_generator.py --directory ./docs                # 使用默认算法为目录下所有文件生成 hash（递归）
   python hash_generator.py --directory ./docs --algorithm md5 # 为目录下所有文件生成 md5 hash（递归）
   python hash_generator.py --directory ./docs --delete       # 删除目录下所有 hash 文件（递归）
   python hash_generator.py --directory ./docs --no-recursive # 只处理当前目录，不递归
   python hash_generator.py --directory ./docs --ignore "*.pyc" --ignore "__pycache__"  # 忽略指定文件/目录
   python hash_generator.py --directory ./docs --ignore ".git" --ignore "venv"  # 忽略多个目录
+  python hash_generator.py --directory ./docs --jobs 4       # 使用 4 个进程并行处理
+  python hash_generator.py --directory ./docs --verbose      # 逐个输出已生成的文件
+  python hash_generator.py --directory ./docs --force        # 忽略已有的 hash 文件，全部重新计算
+  python hash_generator.py --directory ./docs --json         # 以 JSON Lines 格式输出每个文件的 hash
         """
     )
     
@@ -395,16 +918,58 @@ def main():
         help='忽略指定的目录、子目录或文件（支持通配符，可多次使用）。例如: --ignore "*.pyc" --ignore "__pycache__" --ignore ".git"'
     )
     
+    # 并行选项
+    parser.add_argument(
+        '--jobs',
+        '-j',
+        metavar='N',
+        type=int,
+        default=None,
+        help=f'处理目录时的并行任务数（默认: 进程池为 CPU 核心数，线程池为 {IO_QUEUE_DEPTH}；1 表示串行）'
+    )
+    parser.add_argument(
+        '--threads',
+        action='store_true',
+        help='使用线程池代替进程池并行处理（适合 I/O 密集场景，如网络磁盘）'
+    )
+    
+    # 强制重新计算
+    parser.add_argument(
+        '--force',
+        action='store_true',
+        help='忽略已有的 hash 文件，总是重新计算（默认跳过 hash 文件比源文件新的文件）'
+    )
+    
+    # 输出选项
+    parser.add_argument(
+        '--verbose',
+        '-v',
+        action='store_true',
+        help='处理目录时逐个输出已生成/已删除的文件（默认只输出错误和进度）'
+    )
+    parser.add_argument(
+        '--json',
+        action='store_true',
+        help='生成模式下以 JSON Lines 格式输出每个文件的结果（{"path", "algo", "hash"}），汇总信息输出到标准错误'
+    )
+    
     args = parser.parse_args()
     
     # 验证算法
+    if args.algorithm.lower() == 'blake3' and not HAS_BLAKE3:
+        print(f"✗ 错误: blake3 算法需要安装 blake3 库")
+        print(f"请运行: pip install blake3")
+        sys.exit(1)
     if args.algorithm.lower() not in SUPPORTED_ALGORITHMS:
         print(f"✗ 错误: 不支持的算法: {args.algorithm}")
-        print(f"支持的算法: {', '.join(SUPPORTED_ALGORITHMS.keys())}")
+        print(f"支持的算法: {', '.join(sorted(SUPPORTED_ALGORITHMS))}")
         sys.exit(1)
     
     algorithm = args.algorithm.lower()
     
+    # 预编译忽略规则
+    ignore_rules = compile_ignore_patterns(args.ignore_patterns)
+    
     try:
         if args.delete:
             # 删除模式
@@ -422,23 +987,29 @@ def main():
                     sys.exit(1)
             elif args.directory:
                 directory_path = Path(args.directory)
-                deleted_count = delete_hash_files(directory_path, args.recursive, args.ignore_patterns)
+                deleted_count = delete_hash_files(directory_path, args.recursive, ignore_rules, args.verbose)
                 print(f"\n✓ 共删除 {deleted_count} 个 hash 文件")
         else:
-            # 生成模式
+            # 生成模式（JSON 输出时汇总信息写到标准错误，保持标准输出为纯 JSON Lines）
+            summary_stream = sys.stderr if args.json else sys.stdout
             if args.file:
                 file_path = Path(args.file)
-                if process_file(file_path, algorithm):
-                    print(f"\n✓ 成功生成 hash 文件")
-                else:
-                    print(f"\n✗ 生成 hash 文件失败")
+                result = process_file(file_path, algorithm, as_json=args.json, force=args.force)
+                if result is None or result.error:
+                    print(f"\n✗ 生成 hash 文件失败", file=summary_stream)
                     sys.exit(1)
+                elif result.skipped:
+                    print(f"\n✓ 文件未变更，已跳过（使用 --force 强制重新生成）", file=summary_stream)
+                else:
+                    print(f"\n✓ 成功生成 hash 文件", file=summary_stream)
             elif args.directory:
                 directory_path = Path(args.directory)
-                success_count, fail_count = process_directory(directory_path, algorithm, args.recursive, args.ignore_patterns)
-                print(f"\n✓ 成功: {success_count} 个文件")
+                success_count, fail_count, skipped_count = process_directory(directory_path, algorithm, args.recursive, ignore_rules, args.jobs, args.threads, args.verbose, as_json=args.json, force=args.force)
+                print(f"\n✓ 成功: {success_count} 个文件", file=summary_stream)
+                if skipped_count > 0:
+                    print(f"✓ 未变更，跳过: {skipped_count} 个文件", file=summary_stream)
                 if fail_count > 0:
-                    print(f"✗ 失败: {fail_count} 个文件")
+                    print(f"✗ 失败: {fail_count} 个文件", file=summary_stream)
     
     except KeyboardInterrupt:
         print("\n\n已取消操作")
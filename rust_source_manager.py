@@ -8,15 +8,33 @@ Rust 源切换管理工具
 import os
 import sys
 import argparse
+import ctypes
+import functools
 from pathlib import Path
 from typing import Dict, Optional, Any
 import winreg
 
+# 读取 TOML 优先使用标准库 tomllib（Python 3.11+），写入使用 tomli_w
 try:
-    import toml  # pyright: ignore[reportMissingModuleSource]
+    import tomllib
 except ImportError:
-    print("错误: 需要安装 toml 库，请运行: pip install toml")
-    sys.exit(1)
+    tomllib = None
+
+try:
+    import tomli_w  # pyright: ignore[reportMissingImports]
+except ImportError:
+    tomli_w = None
+
+# 缺少上述库时回退到 toml 库
+if tomllib is None or tomli_w is None:
+    try:
+        import toml  # pyright: ignore[reportMissingModuleSource]
+    except ImportError:
+        if tomllib is None:
+            print("错误: 需要安装 toml 库，请运行: pip install toml")
+        else:
+            print("错误: 需要安装 tomli-w 库，请运行: pip install tomli-w")
+        sys.exit(1)
 
 try:
     import questionary
@@ -31,21 +49,40 @@ CONFIG_DIR = SCRIPT_DIR / "config"
 SOURCES_CONFIG_FILE = CONFIG_DIR / "sources.toml"
 
 
+def load_toml(path: Path) -> Dict[str, Any]:
+    """读取 TOML 文件"""
+    if tomllib is not None:
+        with open(path, 'rb') as f:
+            return tomllib.load(f)
+    
+    with open(path, 'r', encoding='utf-8') as f:
+        return toml.load(f)
+
+
+def dump_toml(data: Dict[str, Any], path: Path) -> None:
+    """写入 TOML 文件"""
+    if tomli_w is not None:
+        with open(path, 'wb') as f:
+            tomli_w.dump(data, f)
+        return
+    
+    with open(path, 'w', encoding='utf-8') as f:
+        toml.dump(data, f)
+
+
 def load_sources_config() -> Dict[str, Any]:
     """加载源配置文件"""
     if not SOURCES_CONFIG_FILE.exists():
         raise FileNotFoundError(f"配置文件不存在: {SOURCES_CONFIG_FILE}")
     
-    with open(SOURCES_CONFIG_FILE, 'r', encoding='utf-8') as f:
-        return toml.load(f)
+    return load_toml(SOURCES_CONFIG_FILE)
 
 
 def save_sources_config(config: Dict[str, Any]) -> None:
     """保存源配置文件"""
     CONFIG_DIR.mkdir(parents=True, exist_ok=True)
     
-    with open(SOURCES_CONFIG_FILE, 'w', encoding='utf-8') as f:
-        toml.dump(config, f)
+    dump_toml(config, SOURCES_CONFIG_FILE)
 
 
 def get_current_source(config: Optional[Dict[str, Any]] = None) -> Optional[str]:
@@ -63,42 +100,64 @@ def get_source_config(config: Dict[str, Any], source_name: str) -> Dict[str, Any
     return sources[source_name]
 
 
+def broadcast_environment_change() -> bool:
+    """广播 WM_SETTINGCHANGE 消息，通知其他进程（如资源管理器）重新读取环境变量"""
+    HWND_BROADCAST = 0xFFFF
+    WM_SETTINGCHANGE = 0x001A
+    SMTO_ABORTIFHUNG = 0x0002
+    
+    # lpdwResult 为 DWORD_PTR，与指针等宽
+    result = ctypes.c_size_t()
+    return bool(ctypes.windll.user32.SendMessageTimeoutW(
+        HWND_BROADCAST,
+        WM_SETTINGCHANGE,
+        0,
+        "Environment",
+        SMTO_ABORTIFHUNG,
+        5000,
+        ctypes.byref(result)
+    ))
+
+
 def update_windows_env_vars(source_config: Dict[str, Any]) -> None:
     """更新 Windows 用户级环境变量"""
     try:
-        # 打开用户环境变量注册表项
-        key = winreg.OpenKey(
+        rustup_dist_server = source_config.get('rustup_dist_server', '')
+        rustup_update_root = source_config.get('rustup_update_root', '')
+        
+        # 打开用户环境变量注册表项（with 语句保证异常时也会关闭句柄）
+        with winreg.OpenKey(
             winreg.HKEY_CURRENT_USER,
             r"Environment",
             0,
             winreg.KEY_ALL_ACCESS
-        )
+        ) as key:
+            # 设置环境变量
+            if rustup_dist_server:
+                winreg.SetValueEx(key, "RUSTUP_DIST_SERVER", 0, winreg.REG_SZ, rustup_dist_server)
+                print(f"✓ 已设置环境变量 RUSTUP_DIST_SERVER = {rustup_dist_server}")
+            
+            if rustup_update_root:
+                winreg.SetValueEx(key, "RUSTUP_UPDATE_ROOT", 0, winreg.REG_SZ, rustup_update_root)
+                print(f"✓ 已设置环境变量 RUSTUP_UPDATE_ROOT = {rustup_update_root}")
         
-        # 设置环境变量
-        rustup_dist_server = source_config.get('rustup_dist_server', '')
-        rustup_update_root = source_config.get('rustup_update_root', '')
+        # 两个变量写入后统一广播一次，新启动的程序无需注销即可读取到新值
+        if broadcast_environment_change():
+            print("✓ 已通知系统环境变量更改，新打开的终端将使用新的环境变量")
+        else:
+            print("⚠ 警告: 通知系统环境变量更改失败，新打开的终端可能仍使用旧值")
         
-        if rustup_dist_server:
-            winreg.SetValueEx(key, "RUSTUP_DIST_SERVER", 0, winreg.REG_SZ, rustup_dist_server)
-            print(f"✓ 已设置环境变量 RUSTUP_DIST_SERVER = {rustup_dist_server}")
-        
-        if rustup_update_root:
-            winreg.SetValueEx(key, "RUSTUP_UPDATE_ROOT", 0, winreg.REG_SZ, rustup_update_root)
-            print(f"✓ 已设置环境变量 RUSTUP_UPDATE_ROOT = {rustup_update_root}")
-        
-        winreg.CloseKey(key)
-        
-        # 提示用户重启终端以使环境变量生效
-        # 注意：环境变量已写入注册表，但需要重启终端才能在当前会话中生效
-        print("⚠ 提示: 环境变量已写入注册表，请重启终端以使环境变量生效")
+        # 当前终端进程的环境变量不会被修改
+        print("⚠ 提示: 当前终端需要重新打开才能使环境变量生效")
         print("   或者手动运行: refreshenv (如果安装了 Chocolatey)")
         
     except Exception as e:
         raise RuntimeError(f"修改 Windows 环境变量失败: {e}")
 
 
+@functools.lru_cache(maxsize=1)
 def get_cargo_config_path() -> Path:
-    """获取 Cargo config.toml 文件路径"""
+    """获取 Cargo config.toml 文件路径（结果在进程内缓存）"""
     cargo_home = os.environ.get('CARGO_HOME')
     if cargo_home:
         return Path(cargo_home) / "config.toml"
@@ -165,8 +224,7 @@ def save_history(prev_source_config: Optional[Dict[str, Any]], current_source_co
         'cargo_config': current_source_config.get('cargo_config', '')
     }
     
-    with open(history_file, 'w', encoding='utf-8') as f:
-        toml.dump(history_data, f)
+    dump_toml(history_data, history_file)
     
     print(f"✓ 历史记录已保存: {history_file}")
 
@@ -177,10 +235,11 @@ def has_history() -> bool:
     return history_file.exists()
 
 
-def switch_source(source_name: str, override_params: Optional[Dict[str, str]] = None) -> None:
-    """切换源"""
+def switch_source(source_name: str, override_params: Optional[Dict[str, str]] = None, config: Optional[Dict[str, Any]] = None) -> None:
+    """切换源（可传入已加载的配置，避免重复解析配置文件）"""
     # 加载配置
-    config = load_sources_config()
+    if config is None:
+        config = load_sources_config()
     
     # 验证源是否存在
     if source_name not in config.get('sources', {}):
@@ -192,16 +251,17 @@ def switch_source(source_name: str, override_params: Optional[Dict[str, str]] =
     # 获取 previous 源的配置（如果存在）
     prev_source_config = None
     if prev_source_name and prev_source_name in config.get('sources', {}):
-        prev_source_config = get_source_config(config, prev_source_name).copy()
+        prev_source_config = get_source_config(config, prev_source_name)
     
     # 检查是否为初始化（没有历史记录）
     is_initialization = not has_history()
     
     # 获取源配置
-    source_config = get_source_config(config, source_name).copy()
+    source_config = get_source_config(config, source_name)
     
-    # 应用命令行覆盖参数
+    # 应用命令行覆盖参数（复制一份，覆盖值不写回 sources.toml）
     if override_params:
+        source_config = source_config.copy()
         for key, value in override_params.items():
             if key in source_config:
                 source_config[key] = value
@@ -304,15 +364,16 @@ def show_current_source() -> None:
         print(f"错误: {e}")
 
 
-def interactive_select_source() -> Optional[str]:
-    """交互式选择源（使用 questionary 库）"""
+def interactive_select_source(config: Optional[Dict[str, Any]] = None) -> Optional[str]:
+    """交互式选择源（使用 questionary 库，可传入已加载的配置，避免重复解析配置文件）"""
     if not HAS_QUESTIONARY:
         print("错误: 交互式选择功能需要安装 questionary 库")
         print("请运行: pip install questionary")
         return None
     
     try:
-        config = load_sources_config()
+        if config is None:
+            config = load_sources_config()
         sources = list(config.get('sources', {}).keys())
         current = get_current_source(config)
         
@@ -433,10 +494,11 @@ def main():
         elif args.show:
             show_current_source()
         elif args.interactive:
-            # 交互式选择源
-            selected_source = interactive_select_source()
+            # 交互式选择源（选择和切换共用同一份配置）
+            config = load_sources_config()
+            selected_source = interactive_select_source(config)
             if selected_source:
-                switch_source(selected_source, override_params)
+                switch_source(selected_source, override_params, config)
         elif args.switch is not None:
             # 如果 --switch 没有参数，使用 current 字段指定的源
             if args.switch == '__CURRENT__':
@@ -447,9 +509,9 @@ def main():
                     sys.exit(1)
                 source_name = current
                 print(f"使用 current 字段指定的源: {source_name}")
+                switch_source(source_name, override_params, config)
             else:
-                source_name = args.switch
-            switch_source(source_name, override_params)
+                switch_source(args.switch, override_params)
     
     except FileNotFoundError as e:
         print(f"错误: {e}")